@@ -1,12 +1,14 @@
 """Abstract base class for the database collector"""
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Tuple, List, TypedDict
+from typing import Dict, Any, Tuple, List, NamedTuple
 
 
-class PermissionInfo(TypedDict):
+class PermissionInfo(NamedTuple):
+    """Result of checking the permission of running a collector query"""
+
     query: str
     success: bool
-    example: str
+    example: str  # example of how to grant the privilege
 
 
 class BaseDbCollector(ABC):
@@ -1,12 +1,20 @@
 """Driver collector methods"""
 
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 from typing import Dict, Any, Generator
+import hashlib
+import logging
 import os
 
 from mysql.connector.constants import ClientFlag  # for SSL
 import mysql.connector
 import mysql.connector.connection as mysql_conn
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
+
+try:
+    from mysql.connector.connection_cext import CMySQLConnection
+except ImportError:  # the C extension is not built for this platform
+    CMySQLConnection = None  # pylint: disable=invalid-name
 import psycopg2
 
 from driver.collector.base_collector import BaseDbCollector
@@ -19,6 +27,15 @@ from driver.exceptions import (
 from driver.collector.mysql_collector import MysqlCollector
 from driver.collector.postgres_collector import PostgresCollector
 
+# number of connections in the MySQL pool, one for each metric query that
+# MysqlCollector.collect_metrics runs concurrently: global status, innodb
+# metrics, innodb status, replica status, master status and latency histogram
+MYSQL_POOL_SIZE = 6
+
+# MySQL pools by pool name, kept open across collections so that every collection
+# reuses the established connections instead of connecting again
+_MYSQL_POOLS: Dict[str, MySQLConnectionPool] = {}
+
 
 def create_db_config_mysql(driver_conf: Dict[str, Any]) -> Dict[str, Any]:
     """Convert the driver configuration to the MySQL database configuration
@@ -156,6 +173,104 @@ def connect_mysql(mysql_conf: Dict[str, Any]) -> mysql.connector.MySQLConnection
         raise MysqlCollectorException("Failed to connect to MySQL", ex) from ex
 
 
+def mysql_pool_name(mysql_conf: Dict[str, Any]) -> str:
+    """
+    Names the pool of connections for the mysql configuration. The name is derived from
+    every setting, including the password and SSL files, and stays within the 64
+    characters the connector allows (the default host_port_user_database name does not)
+    Args:
+        mysql_conf: configuration for mysql connection
+    Returns:
+        mysql connection pool name
+    """
+    conf_repr = repr(sorted(mysql_conf.items())).encode("utf-8")
+    return f"ottertune_{hashlib.blake2b(conf_repr, digest_size=16).hexdigest()}"
+
+
+def create_mysql_pool(
+    mysql_conf: Dict[str, Any], pool_name: str, pool_size: int = MYSQL_POOL_SIZE
+) -> MySQLConnectionPool:
+    """
+    Creates a pool of connections to target mysql database
+    Args:
+        mysql_conf: configuration for mysql connection
+        pool_name: name of the pool, see mysql_pool_name
+        pool_size: number of connections in the pool
+    Returns:
+        mysql connection pool
+    Raises:
+        MysqlCollectorException: unable to connect to MySQL
+    """
+    try:
+        # The collector only reads from the database and does not change session
+        # state, so connections are not reset when they are returned to the pool
+        return MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            pool_reset_session=False,
+            autocommit=True,
+            **mysql_conf,
+        )
+    except mysql.connector.Error as ex:
+        raise MysqlCollectorException("Failed to connect to MySQL", ex) from ex
+
+
+def get_mysql_pool(mysql_conf: Dict[str, Any]) -> MySQLConnectionPool:
+    """
+    Gets the pool of connections to target mysql database, creating it on first use.
+    The pool is kept open for the lifetime of the driver, and a new pool is created
+    whenever the configuration changes
+    Args:
+        mysql_conf: configuration for mysql connection
+    Returns:
+        mysql connection pool
+    Raises:
+        MysqlCollectorException: unable to connect to MySQL
+    """
+    pool_name = mysql_pool_name(mysql_conf)
+    pool = _MYSQL_POOLS.get(pool_name)
+    if pool is None:
+        pool = _MYSQL_POOLS[pool_name] = create_mysql_pool(mysql_conf, pool_name)
+        with closing(get_pooled_mysql_connection(pool)) as pooled_conn:
+            if is_pure_mysql_connection(pooled_conn):
+                logging.warning(
+                    "MySQL connections do not use the mysql-connector C extension, "
+                    "data will be collected with the slower pure Python implementation"
+                )
+    return pool
+
+
+def get_pooled_mysql_connection(pool: MySQLConnectionPool) -> PooledMySQLConnection:
+    """
+    Checks a connection out of the pool of connections to target mysql database
+    Args:
+        pool: mysql connection pool
+    Returns:
+        pooled mysql connection, which is returned to the pool when closed
+    Raises:
+        MysqlCollectorException: pool is exhausted or unable to reconnect to MySQL
+    """
+    try:
+        return pool.get_connection()
+    except mysql.connector.Error as ex:
+        raise MysqlCollectorException("Failed to connect to MySQL", ex) from ex
+
+
+def is_pure_mysql_connection(pooled_conn: PooledMySQLConnection) -> bool:
+    """
+    Checks whether the pooled connection decodes the MySQL protocol in Python instead
+    of with the C extension, which the connector falls back to when it is not built
+    Args:
+        pooled_conn: pooled mysql connection
+    Returns:
+        True if the connection uses the pure Python implementation
+    """
+    # pylint: disable=protected-access
+    return CMySQLConnection is None or not isinstance(
+        pooled_conn._cnx, CMySQLConnection
+    )
+
+
 def connect_postgres(postgres_conf: Dict[str, Any]):
     """
     Connects to target postres database
@@ -215,7 +330,7 @@ def get_collector(
 ) -> Generator[BaseDbCollector, None, None]:
     """Get the database collector according to database type
 
-    Callers should use in a "with" block to ensure connection object is closed.
+    Callers should use in a "with" block to ensure connection objects are closed.
 
     e.g.    with get_collector(driver_conf) as collector:
                 ...
@@ -248,9 +363,10 @@ def get_collector(
 
         elif driver_conf["db_type"] in ["mysql", "aurora_mysql"]:
             mysql_conf = create_db_config_mysql(driver_conf)
-            conn = connect_mysql(mysql_conf)
-            version = get_mysql_version(conn)
-            collector = MysqlCollector(conn, version)
+            pool = get_mysql_pool(mysql_conf)
+            with closing(get_pooled_mysql_connection(pool)) as pooled_conn:
+                version = get_mysql_version(pooled_conn)
+            collector = MysqlCollector(pool, version)
         elif driver_conf["db_type"] in ["postgres", "aurora_postgresql"]:
             pg_conf = create_db_config_postgres(driver_conf)
             conn = connect_postgres(pg_conf)
@@ -1,25 +1,54 @@
 """MySQL database collector to get knob and metric data from the target database"""
-import json
-from decimal import Decimal
-from typing import Dict, List, Any, Tuple, NamedTuple
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import repeat
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Any,
+    Tuple,
+    Optional,
+    Iterable,
+    Generator,
+)
 import mysql.connector
-import mysql.connector.connection as mysql_conn
 from mysql.connector import errorcode
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
 
 from driver.exceptions import MysqlCollectorException
 from driver.collector.base_collector import BaseDbCollector, PermissionInfo
 
-
-class LatencyHistogram(NamedTuple):
-    """namedtuple for latency histogram"""
-
-    bucket_number: int
-    # TODO(bohan) everything below here except bucket_quantile can be int right?
-    bucket_timer_low: float
-    bucket_timer_high: float
-    count_bucket: float
-    count_bucket_and_lower: float
-    bucket_quantile: float
+# column names of the latency histogram rows, in METRICS_LATENCY_HIST_SQL order
+LATENCY_HIST_FIELDS = (
+    "bucket_number",
+    "bucket_timer_low",
+    "bucket_timer_high",
+    "count_bucket",
+    "count_bucket_and_lower",
+    "bucket_quantile",
+)
+
+# percentiles of statement latency reported in the derived metrics
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# global status counters read by the derived metrics, in unpacking order
+DERIVED_METRICS_STATUS_KEYS = (
+    "innodb_buffer_pool_reads",
+    "innodb_buffer_pool_read_requests",
+    "com_select",
+    "com_insert",
+    "com_update",
+    "com_delete",
+    "com_replace",
+)
+
+# time of the last successful permission check, by pool name. A collector only lives
+# for one collection, while its pool is kept open across collections
+_PERMISSION_OK_TS: Dict[str, float] = {}
 
 
 class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attributes
@@ -33,39 +62,70 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
         "WHERE subsystem = 'transaction';"
     )
 
-    # convert the time unit from ps to us by dividing 1,000,000
+    # convert the time unit from ps to us by dividing 1,000,000. Dividing by a
+    # floating point literal makes the server return doubles instead of decimals.
+    # The percentile lookup needs the buckets in order, which the table does not promise
     METRICS_LATENCY_HIST_SQL = (
-        "SELECT bucket_number, bucket_timer_low / 1000000, "
-        "bucket_timer_high / 1000000, count_bucket, "
+        "SELECT bucket_number, bucket_timer_low / 1e6, "
+        "bucket_timer_high / 1e6, count_bucket, "
         "count_bucket_and_lower, bucket_quantile FROM "
-        "performance_schema.events_statements_histogram_global;"
+        "performance_schema.events_statements_histogram_global "
+        "ORDER BY bucket_number;"
     )
 
     ENGINE_INNODB_SQL = "SHOW ENGINE INNODB STATUS;"
     ENGINE_MASTER_SQL = "SHOW MASTER STATUS;"
 
-    def __init__(self, conn: mysql_conn.MySQLConnection, version: str) -> None:
+    # how long (seconds) a successful permission check is reused before querying again
+    PERMISSION_CACHE_TTL_S = 300
+
+    def __init__(self, pool: MySQLConnectionPool, version: str) -> None:
         """
-        Callers should make sure that the connection object is closed after using
-        the collector. This likely means that callers should not insantiate this class
-        directly and instead use the collector_factory.get_collector method instead.
+        The pool is owned by the caller. This likely means that callers should not
+        insantiate this class directly and instead use the
+        collector_factory.get_collector method instead.
+
+        Every query checks a connection out of the pool and returns it once the
+        results are fetched, so independent queries can run concurrently on up to
+        pool_size connections. The pool raises instead of waiting when it has no
+        connection left, so nothing else may hold a connection of the pool while
+        the collector runs.
 
         Args:
-            conn: The connection to the database
+            pool: The pool of connections to the database
             version: DB version (e.g. 5.7.3)
         """
-        self._conn = conn
+        self._pool = pool
         self._version_str = version
-        self._version = float(".".join(version.split(".")[:2]))
-        self._innodb_status: str = ""
-        self._global_status: Dict[str, Any] = {}
+        version_parts = [int(part) for part in version.split(".")[:3]]
+        version_tuple = tuple(version_parts + [0] * (3 - len(version_parts)))
+        # The latency histogram is available from MySQL 8.0
+        self._supports_latency_hist = version_tuple >= (8, 0, 0)
         # From MySQL 8.0.22, SHOW REPLICA STATUS is available to use.
-        if self._version > 8.0:
+        self._supports_replica_syntax = version_tuple >= (8, 0, 22)
+        self._global_status: Dict[str, Any] = {}
+        if self._supports_replica_syntax:
             # pylint: disable=invalid-name
             self.ENGINE_REPLICA_SQL: str = "SHOW REPLICA STATUS;"
         else:
             self.ENGINE_REPLICA_SQL: str = "SHOW SLAVE STATUS;"
 
+        # Privileges needed by each collector query, used by check_permission.
+        # The SHOW STATUS and SHOW VARIABLES statements do not need any privileges
+        self._sql_priv_map: Dict[str, str] = {
+            self.ENGINE_INNODB_SQL: "PROCESS",
+            self.KNOBS_SQL: "",
+            self.ENGINE_MASTER_SQL: "REPLICATION CLIENT",
+            self.ENGINE_REPLICA_SQL: "REPLICATION CLIENT",
+            self.METRICS_INNODB_SQL: "PROCESS",
+            self.METRICS_SQL: "",
+            self.VERSION_SQL: "",
+        }
+        if self._supports_latency_hist:
+            self._sql_priv_map[
+                self.METRICS_LATENCY_HIST_SQL
+            ] = "performance_schema.events_statements_histogram_global"
+
     def _cmd(self, sql: str):  # type: ignore
         """Run the command line (sql query), and fetch the returned results.
 
@@ -76,17 +136,86 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
         Raises:
             MysqlCollectorException: Failed to execute the sql query
         """
+        return self._pooled_cmd(self._fetch, sql)
+
+    def _cmd_as_dict(self, sql: str, lower_keys: bool = False) -> Dict[str, Any]:
+        """Run a (name, value) sql query, and build a dict from the returned rows.
+
+        Args:
+            sql: Sql query which is executed
+            lower_keys: Whether the names should be converted to lower case
+        Returns:
+            Dict mapping the first column of each row to the second column
+        Raises:
+            MysqlCollectorException: Failed to execute the sql query
+        """
+        return self._pooled_cmd(partial(self._fetch_dict, lower_keys=lower_keys), sql)
+
+    @contextmanager
+    def _connection(self) -> Generator[PooledMySQLConnection, None, None]:
+        """Check a connection out of the pool, and return it to the pool afterwards
+
+        Raises:
+            MysqlCollectorException: Failed to get a connection from the pool
+        """
+        try:
+            conn = self._pool.get_connection()
+        except mysql.connector.Error as ex:
+            msg = "Failed to get a connection from the pool"
+            raise MysqlCollectorException(msg, ex) from ex
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _pooled_cmd(self, fetch: Callable[[Any, str], Any], sql: str) -> Any:
+        """Run the sql query on a connection checked out from the pool
+
+        Args:
+            fetch: Function executing the sql query on a cursor, e.g. _fetch
+            sql: Sql query which is executed
+        Returns:
+            Fetched results of the query, in the form returned by fetch
+        Raises:
+            MysqlCollectorException: Failed to get a connection or execute the sql query
+        """
+        with self._connection() as conn:
+            return fetch(conn.cursor(dictionary=False), sql)
+
+    @staticmethod
+    def _fetch(cursor: Any, sql: str):  # type: ignore
+        """Execute the sql query on the given cursor and fetch the results"""
         try:
-            cursor = self._conn.cursor(dictionary=False)
             cursor.execute(sql)
             res = cursor.fetchall()
             columns = cursor.description
-            meta = [col[0] for col in columns]
+            meta = tuple(col[0] for col in columns)
             return res, meta
         except Exception as ex:  # pylint: disable=broad-except
             msg = f"Failed to execute sql {sql}"
             raise MysqlCollectorException(msg, ex) from ex
 
+    @staticmethod
+    def _fetch_dict(cursor: Any, sql: str, lower_keys: bool = False) -> Dict[str, Any]:
+        """Execute the (name, value) sql query on the given cursor and build a dict"""
+        try:
+            cursor.execute(sql)
+            return MysqlCollector._rows_to_dict(cursor.fetchall(), lower_keys)
+        except Exception as ex:  # pylint: disable=broad-except
+            msg = f"Failed to execute sql {sql}"
+            raise MysqlCollectorException(msg, ex) from ex
+
+    @staticmethod
+    def _rows_to_dict(
+        rows: Iterable[Tuple[Any, Any]], lower_keys: bool = False
+    ) -> Dict[str, Any]:
+        """Build a dict from (name, value) rows"""
+        if lower_keys:
+            # calling the unbound str.lower skips a method lookup per row
+            lower = str.lower
+            return {lower(name): value for name, value in rows}
+        return dict(rows)
+
     def get_version(self) -> str:
         """Get database version"""
 
@@ -95,35 +224,32 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
     def check_permission(self) -> Tuple[bool, List[PermissionInfo], str]:
         """Check the permissions of running all collector queries.
 
+        A successful result is reused for PERMISSION_CACHE_TTL_S seconds by the
+        collectors on the same pool. Failures are not cached, so that a missing
+        privilege is picked up as soon as it is granted.
+
+        The queries are probed concurrently, each on its own pooled connection.
+
         Returns:
             True if the user has all expected permissions. If errors appear, return False,
             as well as the information about how to grant corresponding permissions.
         Raises:
             MysqlCollectorException: Failed to connect to the database
         """
-        success = True
-        # The SHOW STATUS and SHOW VARIABLES statements do not need any privileges
-        sql_priv_map = {
-            self.ENGINE_INNODB_SQL: "PROCESS",
-            self.KNOBS_SQL: "",
-            self.ENGINE_MASTER_SQL: "REPLICATION CLIENT",
-            self.ENGINE_REPLICA_SQL: "REPLICATION CLIENT",
-            self.METRICS_INNODB_SQL: "PROCESS",
-            self.METRICS_SQL: "",
-            self.VERSION_SQL: "",
-        }
-        if self._version >= 8.0:
-            sql_priv_map[
-                self.METRICS_LATENCY_HIST_SQL
-            ] = "performance_schema.events_statements_histogram_global"
+        perm_ok_ts = _PERMISSION_OK_TS.get(self._pool.pool_name)
+        if (
+            perm_ok_ts is not None
+            and time.monotonic() - perm_ok_ts < self.PERMISSION_CACHE_TTL_S
+        ):
+            return True, [], ""
+
+        with ThreadPoolExecutor(max_workers=self._pool.pool_size) as executor:
+            probes = list(executor.map(self._probe_sql, self._sql_priv_map))
 
+        success = True
         results = []
-        for sql, priv in sql_priv_map.items():
-            try:
-                cursor = self._conn.cursor(dictionary=False)
-                cursor.execute(sql)
-                cursor.fetchall()
-            except mysql.connector.Error as err:
+        for (sql, priv), err in zip(self._sql_priv_map.items(), probes):
+            if err is not None:
                 example = "unknown"
                 if err.errno in (
                     errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR,
@@ -132,27 +258,43 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
                     example = f"GRANT {priv} ON *.* TO <user>@<host>;"
                 elif err.errno == errorcode.ER_TABLEACCESS_DENIED_ERROR:
                     example = f"GRANT SELECT ON {priv} TO <user>@<'host'>;"
-                info = {}
-                info["query"] = sql
-                info["success"] = False
-                # example of how to grant the privilege
-                info["example"] = example
-                results.append(info)
+                results.append(
+                    PermissionInfo(query=sql, success=False, example=example)
+                )
                 success = False
         # debug info
         # TODO(bohan) (from nappelson) I think debug information like this should be
         # propgated in a different way For instance, this kind of information
         # should be pushed somewhere. For now, we can leave as is.
-        text_lines = []
-        for res in results:
-            text_lines.append("-----------------------------------------------\n")
-            text_lines.append(f"Permissions check failed for SQL: {res['query']}\n")
-            text_lines.append(
-                f"Please grant the privilege. For example: {res['example']}\n"
-            )
-        text = "".join(text_lines)
+        text = "".join(
+            "-----------------------------------------------\n"
+            f"Permissions check failed for SQL: {res.query}\n"
+            f"Please grant the privilege. For example: {res.example}\n"
+            for res in results
+        )
+        if success:
+            _PERMISSION_OK_TS[self._pool.pool_name] = time.monotonic()
+        else:
+            _PERMISSION_OK_TS.pop(self._pool.pool_name, None)
         return success, results, text
 
+    def _probe_sql(self, sql: str) -> Optional[mysql.connector.Error]:
+        """Run the sql query for the permission check
+
+        Returns:
+            The error raised by the database if the query failed, None otherwise
+        Raises:
+            MysqlCollectorException: Failed to get a connection from the pool
+        """
+        with self._connection() as conn:
+            try:
+                cursor = conn.cursor(dictionary=False)
+                cursor.execute(sql)
+                cursor.fetchall()
+                return None
+            except mysql.connector.Error as err:
+                return err
+
     def collect_knobs(self) -> Dict[str, Any]:
         """Collect database knobs information
 
@@ -164,18 +306,60 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
 
         knobs: Dict[str, Any] = {"global": {"global": {}}, "local": None}
 
-        knobs["global"]["global"] = dict(self._cmd(self.KNOBS_SQL)[0])
+        knobs["global"]["global"] = self._cmd_as_dict(self.KNOBS_SQL)
         return knobs
 
+    def _metrics_sqls(self) -> List[str]:
+        """Sql queries needed to build the metrics data, besides the global status"""
+        return [
+            self.METRICS_INNODB_SQL,
+            self.ENGINE_INNODB_SQL,
+            self.ENGINE_REPLICA_SQL,
+            self.ENGINE_MASTER_SQL,
+        ]
+
     def collect_metrics(self) -> Dict[str, Any]:
         """Collect database metrics information
 
+        The queries run concurrently, each on its own connection from the pool, so the
+        collection waits on the slowest query rather than on the sum of all of them.
+        Checking a connection out of the pool pings it first, which adds one more
+        round-trip before each query.
+
         Returns:
             Database metric data
         Raises:
             MysqlCollectorException: Failed to execute the sql query to get metric data
         """
 
+        sqls = self._metrics_sqls()
+        if self._supports_latency_hist:
+            sqls.append(self.METRICS_LATENCY_HIST_SQL)
+        # at most one connection per worker, so the pool is never exhausted
+        with ThreadPoolExecutor(max_workers=self._pool.pool_size) as executor:
+            global_status = executor.submit(
+                self._cmd_as_dict, self.METRICS_SQL, lower_keys=True
+            )
+            results = dict(zip(sqls, executor.map(self._cmd, sqls)))
+        lat_hist = results.pop(self.METRICS_LATENCY_HIST_SQL, ([], ()))[0]
+        return self._build_metrics(global_status.result(), results, lat_hist)
+
+    def _build_metrics(
+        self,
+        global_status: Dict[str, Any],
+        results: Dict[str, Tuple[Any, Any]],
+        lat_hist: List[Tuple[Any, ...]],
+    ) -> Dict[str, Any]:
+        """Build the metrics data from the fetched results of the metric queries
+
+        Args:
+            global_status: Global status variables, keyed by lower case name
+            results: (rows, meta) results keyed by the sql query which produced them
+            lat_hist: Rows of the latency histogram, only consumed for mysql >= 8.0
+        Returns:
+            Database metric data
+        """
+
         metrics: Dict[str, Any] = {
             "global": {
                 "global": {},
@@ -186,49 +370,82 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
             },
             "local": None,
         }
-        self._global_status = {
-            x[0].lower(): x[1] for x in self._cmd(self.METRICS_SQL)[0]
-        }
+        self._global_status = global_status
         metrics["global"]["global"] = self._global_status
-        metrics["global"]["innodb_metrics"] = dict(
-            self._cmd(self.METRICS_INNODB_SQL)[0]
-        )
-        self._innodb_status = self._cmd(self.ENGINE_INNODB_SQL)[0][0][-1]
-        metrics["global"]["engine"]["innodb_status"] = self._innodb_status
+        metrics["global"]["innodb_metrics"] = dict(results[self.METRICS_INNODB_SQL][0])
+        # the status text is the last column of the single returned row
+        innodb_status_rows = results[self.ENGINE_INNODB_SQL][0]
+        metrics["global"]["engine"]["innodb_status"] = innodb_status_rows[0][-1]
         metrics["global"]["derived"] = self._collect_derived_metrics()
         # replica status and master status
-        replica_metrics, replica_meta = self._cmd(self.ENGINE_REPLICA_SQL)
-        if len(replica_metrics) > 0:
-            replica_metrics = replica_metrics[0]
-            replica_json = dict(zip(replica_meta, replica_metrics))
-            metrics["global"]["engine"]["replica_status"] = json.dumps(replica_json)
-        else:
-            metrics["global"]["engine"]["replica_status"] = ""
+        metrics["global"]["engine"]["replica_status"] = self._first_row_as_dict(
+            *results[self.ENGINE_REPLICA_SQL]
+        )
+        metrics["global"]["engine"]["master_status"] = self._first_row_as_dict(
+            *results[self.ENGINE_MASTER_SQL]
+        )
 
-        master_metrics, master_meta = self._cmd(self.ENGINE_MASTER_SQL)
-        if len(master_metrics) > 0:
-            master_metrics = master_metrics[0]
-            master_json = dict(zip(master_meta, master_metrics))
-            metrics["global"]["engine"]["master_status"] = json.dumps(master_json)
-        else:
-            metrics["global"]["engine"]["master_status"] = ""
-
-        if float(self._version) >= 8.0:
-            # latency histogram
-            lat_hist_list = []
-            lat_hist = self._cmd(self.METRICS_LATENCY_HIST_SQL)[0]
-            for lat_row in lat_hist:
-                lat_row_new = [
-                    float(elem) if isinstance(elem, Decimal) else elem
-                    for elem in lat_row
-                ]
-                lat_elem = LatencyHistogram._make(lat_row_new)._asdict()
-                lat_hist_list.append(lat_elem)
+        if self._supports_latency_hist:
+            # latency histogram, in columnar form: the fetched row of each bucket,
+            # kept as a tuple since it serializes to the same json array
             metrics["global"]["performance_schema"][
                 "events_statements_histogram_global"
-            ] = json.dumps(lat_hist_list)
+            ] = {"columns": list(LATENCY_HIST_FIELDS), "data": lat_hist}
+            metrics["global"]["derived"].update(
+                self._collect_latency_percentiles(lat_hist)
+            )
         return metrics
 
+    @staticmethod
+    def _first_row_as_dict(
+        rows: List[Tuple[Any, ...]], meta: Tuple[str, ...]
+    ) -> Dict[str, Any]:
+        """Map the column names to the values of the first row
+
+        Args:
+            rows: Fetched rows of the query
+            meta: Column names of the query
+        Returns:
+            Dict of column name to value, empty if the query returned no rows
+        Raises:
+            MysqlCollectorException: The row does not have one value per column
+        """
+        if not rows:
+            return {}
+        row = rows[0]
+        if len(row) != len(meta):
+            msg = f"Row has {len(row)} values for {len(meta)} columns {meta}"
+            raise MysqlCollectorException(msg)
+        return dict(zip(meta, row))
+
+    @staticmethod
+    def _collect_latency_percentiles(
+        lat_hist_data: List[Tuple[Any, ...]],
+    ) -> Dict[str, float]:
+        """Estimate statement latency percentiles from the latency histogram
+
+        The percentile is the upper bound of the first bucket whose cumulative
+        quantile reaches it. Buckets are ordered, so this is a binary search over
+        the bucket_quantile column.
+
+        Args:
+            lat_hist_data: Latency histogram rows (LATENCY_HIST_FIELDS order),
+                ordered by bucket_number
+        Returns:
+            Latency (us) of each percentile in LATENCY_PERCENTILES, 0.0 if unknown
+        """
+        quantile_idx = LATENCY_HIST_FIELDS.index("bucket_quantile")
+        timer_high_idx = LATENCY_HIST_FIELDS.index("bucket_timer_high")
+        quantiles = [bucket[quantile_idx] for bucket in lat_hist_data]
+        percentiles = {}
+        for percentile in LATENCY_PERCENTILES:
+            idx = bisect_left(quantiles, percentile / 100)
+            latency = 0.0
+            if idx < len(lat_hist_data):
+                latency = lat_hist_data[idx][timer_high_idx]
+            percentiles[f"latency_p{percentile}_us"] = latency
+        return percentiles
+
     def _collect_derived_metrics(self) -> Dict[str, Any]:
         """Collect metrics derived from base metrics
 
@@ -239,35 +456,33 @@ class MysqlCollector(BaseDbCollector):  # pylint: disable=too-many-instance-attr
             Database calculated derived metrics
         """
 
-        # buffer pool miss ratio
-        innodb_buffer_pool_reads = int(
-            self._global_status.get("innodb_buffer_pool_reads", 0)
-        )
-        innodb_buffer_pool_read_requests = int(
-            self._global_status.get("innodb_buffer_pool_read_requests", 0)
+        (
+            innodb_buffer_pool_reads,
+            innodb_buffer_pool_read_requests,
+            read_counts,
+            *write_counts_by_type,
+        ) = map(
+            int,
+            map(self._global_status.get, DERIVED_METRICS_STATUS_KEYS, repeat(0)),
         )
+
+        # buffer pool miss ratio, as a percentage with 2 decimals
         if innodb_buffer_pool_read_requests == 0:
             buffer_miss_ratio = 0.0
         else:
-            buffer_miss_ratio = (
-                round(innodb_buffer_pool_reads / innodb_buffer_pool_read_requests, 4)
-                * 100
+            buffer_miss_ratio = round(
+                innodb_buffer_pool_reads * 100 / innodb_buffer_pool_read_requests, 2
             )
 
         # read write query ratio
-        read_counts = int(self._global_status.get("com_select", 0))
-        write_counts = (
-            int(self._global_status.get("com_insert", 0))
-            + int(self._global_status.get("com_update", 0))
-            + int(self._global_status.get("com_delete", 0))
-            + int(self._global_status.get("com_replace", 0))
-        )
+        write_counts = sum(write_counts_by_type)
         read_counts = 1 if read_counts == 0 else read_counts
         write_counts = 1 if write_counts == 0 else write_counts
         read_write_ratio = round(read_counts / write_counts, 4)  # keep 4 decimals here
 
         # merge metrics
-        derived_metrics = dict(
-            buffer_miss_ratio=buffer_miss_ratio, read_write_ratio=read_write_ratio
-        )
+        derived_metrics = {
+            "buffer_miss_ratio": buffer_miss_ratio,
+            "read_write_ratio": read_write_ratio,
+        }
         return derived_metrics
@@ -2,10 +2,25 @@
 
 from typing import Dict, Any, TypedDict, Set
 from http import HTTPStatus
+import json
 from requests import Session
 
 from driver.exceptions import ComputeServerClientException
 
+try:
+    import orjson
+
+    def _json_dumps(data: Any) -> bytes:
+        """Serialize data to json with orjson"""
+        return orjson.dumps(data)  # pylint: disable=no-member
+
+except ImportError:  # orjson is optional, fall back to the standard library
+
+    def _json_dumps(data: Any) -> bytes:
+        """Serialize data to json with the standard json module"""
+        return json.dumps(data).encode("utf-8")
+
+
 SECONDS_TO_MS = 1000
 RETRYABLE_HTTP_STATUS: Set[int] = {
     HTTPStatus.REQUEST_TIMEOUT,
@@ -64,10 +79,11 @@ class ComputeServerClient:
         headers["ApiKey"] = self._api_key
         headers["organization_id"] = data["organization_id"]
         headers["agent_version"] = AGENT_VERSION
+        headers["Content-Type"] = "application/json"
         url = f"{self._server_url}/observation/"
         try:
             response = self._req_session.post(
-                url, json=data, headers=headers, timeout=10
+                url, data=_json_dumps(data), headers=headers, timeout=10
             )
             response.raise_for_status()
         except Exception as ex:
@@ -6,11 +6,17 @@ from unittest.mock import MagicMock
 import mock
 import pytest
 import mysql.connector.connection
+from mysql.connector.pooling import MySQLConnectionPool
 import psycopg2
 from driver.collector.collector_factory import (
+    MYSQL_POOL_SIZE,
     create_db_config_mysql,
+    create_mysql_pool,
+    get_collector,
+    get_mysql_pool,
     get_mysql_version,
     get_postgres_version,
+    mysql_pool_name,
 )
 from driver.collector.collector_factory import create_db_config_postgres
 from driver.exceptions import (
@@ -182,3 +188,83 @@ def test_get_mysql_version_sql_failure(mock_mysql_conn: MagicMock) -> NoReturn:
     with pytest.raises(MysqlCollectorException) as ex:
         get_mysql_version(mock_mysql_conn)
     assert "Failed to get MySQL version" in str(ex.value)
+
+
+@mock.patch("driver.collector.collector_factory.MySQLConnectionPool")
+def test_get_mysql_pool_reused(
+    mock_pool_cls: MagicMock, monkeypatch: pytest.MonkeyPatch
+) -> NoReturn:
+    monkeypatch.setattr("driver.collector.collector_factory._MYSQL_POOLS", {})
+    mock_pool_cls.side_effect = lambda **_: MagicMock(spec=MySQLConnectionPool)
+    conf = {
+        "host": "localhost",
+        "port": "3306",
+        "user": "test_user",
+        "database": "test_db",
+    }
+    pool = get_mysql_pool(conf)
+    assert get_mysql_pool(dict(conf)) is pool
+    mock_pool_cls.assert_called_once_with(
+        pool_name=mysql_pool_name(conf),
+        pool_size=MYSQL_POOL_SIZE,
+        pool_reset_session=False,
+        autocommit=True,
+        **conf,
+    )
+    # a new password needs new connections
+    assert get_mysql_pool({**conf, "password": "new_password"}) is not pool
+    assert mock_pool_cls.call_count == 2
+
+
+@mock.patch("driver.collector.collector_factory.MySQLConnectionPool")
+def test_get_mysql_pool_warns_pure_connection(
+    mock_pool_cls: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> NoReturn:
+    monkeypatch.setattr("driver.collector.collector_factory._MYSQL_POOLS", {})
+    mock_pool = mock_pool_cls.return_value
+    # pylint: disable=protected-access
+    mock_pool.get_connection.return_value._cnx = MagicMock(
+        spec=mysql.connector.connection.MySQLConnection
+    )
+    conf = {"host": "localhost", "port": "3306", "user": "test_user"}
+    get_mysql_pool(conf)
+    get_mysql_pool(conf)
+    # warned once, when the pool is created
+    assert caplog.text.count("pure Python implementation") == 1
+    mock_pool.get_connection.return_value.close.assert_called_once()
+
+
+@mock.patch.object(MySQLConnectionPool, "add_connection")
+def test_create_mysql_pool_rds_endpoint(mock_add_connection: MagicMock) -> NoReturn:
+    conf = create_db_config_mysql(
+        {
+            "db_host": "ottertune-prod-db.c9akciq32.us-east-1.rds.amazonaws.com",
+            "db_port": 3306,
+            "db_user": "ottertune_agent",
+            "db_password": "test_password",
+            "db_name": "mysql",
+        }
+    )
+    pool = create_mysql_pool(conf, mysql_pool_name(conf))
+    assert pool.pool_name == mysql_pool_name(conf)
+    assert mock_add_connection.call_count == MYSQL_POOL_SIZE
+
+
+@mock.patch("driver.collector.collector_factory.get_mysql_pool")
+def test_get_collector_mysql_pool_exhausted(mock_get_pool: MagicMock) -> NoReturn:
+    mock_get_pool.return_value.get_connection.side_effect = (
+        mysql.connector.errors.PoolError("Failed getting connection; pool exhausted")
+    )
+    driver_conf = {
+        "db_type": "mysql",
+        "db_host": "localhost",
+        "db_port": "3306",
+        "db_user": "test_user",
+        "db_password": "test_password",
+    }
+    with pytest.raises(MysqlCollectorException) as ex:
+        with get_collector(driver_conf):
+            pass
+    assert "Failed to connect to MySQL" in ex.value.message
@@ -2,6 +2,7 @@
 Tests for the compute server client
 """
 from typing import Dict, Any
+import json
 import pytest
 import responses
 import requests
@@ -72,6 +73,9 @@ def test_post_observation_success(test_data: Dict[str, Any]) -> None:
         api_key=test_data["api_key"],
     )
     client.post_observation(test_data["observation"])
+    request = responses.calls[0].request
+    assert request.headers["Content-Type"] == "application/json"
+    assert json.loads(request.body) == test_data["observation"]
 
 
 @responses.activate
@@ -5,7 +5,11 @@ import json
 
 import mysql.connector
 
-from driver.collector.collector_factory import get_mysql_version, connect_mysql
+from driver.collector.collector_factory import (
+    get_mysql_version,
+    connect_mysql,
+    get_mysql_pool,
+)
 from driver.database import collect_data_from_database
 from driver.collector.mysql_collector import MysqlCollector
 
@@ -78,8 +82,8 @@ def test_mysql_collector_version(
     conf = _get_conf(mysql_user, mysql_password, mysql_host, mysql_port, mysql_database)
     conn = connect_mysql(conf)
     version = get_mysql_version(conn)
-    collector = MysqlCollector(conn, version)
     conn.close()
+    collector = MysqlCollector(get_mysql_pool(conf), version)
     assert collector.get_version() == version
 
 
@@ -93,9 +97,10 @@ def test_mysql_collector_permission_success(
     conf = _get_conf(mysql_user, mysql_password, mysql_host, mysql_port, mysql_database)
     conn = connect_mysql(conf)
     version = get_mysql_version(conn)
-    collector = MysqlCollector(conn, version)
-    perm_res = collector.check_permission()
     conn.close()
+    pool = get_mysql_pool(conf)
+    collector = MysqlCollector(pool, version)
+    perm_res = collector.check_permission()
     assert perm_res[1] == []
     assert perm_res[0] is True
 
@@ -115,9 +120,8 @@ def test_mysql_collector_permission_failed(
     # additional permissions are not granted for a new test user
     _create_user(conn, new_user, new_password)
     new_conf = _get_conf(new_user, new_password, mysql_host, mysql_port, mysql_database)
-    new_conn = connect_mysql(new_conf)
-    version = get_mysql_version(conn)
-    new_collector = MysqlCollector(new_conn, version)
+    new_pool = get_mysql_pool(new_conf)
+    new_collector = MysqlCollector(new_pool, version)
     perm_res = new_collector.check_permission()
 
     # drop the test user
@@ -142,9 +146,10 @@ def test_mysql_collector_knobs(
     conf = _get_conf(mysql_user, mysql_password, mysql_host, mysql_port, mysql_database)
     conn = connect_mysql(conf)
     version = get_mysql_version(conn)
-    collector = MysqlCollector(conn, version)
-    knobs = collector.collect_knobs()
     conn.close()
+    pool = get_mysql_pool(conf)
+    collector = MysqlCollector(pool, version)
+    knobs = collector.collect_knobs()
     # the knob json should not contain any field that cannot be converted to a string,
     # like decimal type and datetime type
     json.dumps(knobs)
@@ -178,9 +183,10 @@ def test_mysql_collector_metrics(
     conf = _get_conf(mysql_user, mysql_password, mysql_host, mysql_port, mysql_database)
     conn = connect_mysql(conf)
     version_str = get_mysql_version(conn)
-    collector = MysqlCollector(conn, version_str)
-    metrics = collector.collect_metrics()
     conn.close()
+    pool = get_mysql_pool(conf)
+    collector = MysqlCollector(pool, version_str)
+    metrics = collector.collect_metrics()
     # the metric json should not contain any field that cannot be converted to a string,
     # like decimal type and datetime type
     json.dumps(metrics)
@@ -1,34 +1,25 @@
 """Tests for interacting with Mysql database locally"""
-import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Callable, Dict, List, NoReturn, Union, Optional
 from unittest.mock import MagicMock, PropertyMock
 import pytest
 import mysql.connector.connection
 from mysql.connector import errorcode
+from mysql.connector.pooling import MySQLConnectionPool
 from driver.collector.mysql_collector import MysqlCollector
 from driver.exceptions import MysqlCollectorException
 
 # pylint: disable=missing-function-docstring
 
 
-@dataclass()
+@dataclass
 class SqlData:
     """
     Used for providing a set of mock data when collector is collecting metrics
     """
 
-    global_status: List[List[Union[int, str]]]
-    innodb_metrics: List[List[Union[int, str]]]
-    innodb_status: List[List[str]]
-    latency_hist: List[List[float]]
-    master_status: List[List[Union[int, str]]]
-    master_status_meta: List[List[str]]
-    replica_status: List[List[Union[int, str]]]
-    replica_status_meta: List[List[str]]
-
-    def __init__(self) -> None:
-        self.global_status = [
+    global_status: List[List[Union[int, str]]] = field(
+        default_factory=lambda: [
             ["Innodb_buffer_pool_reads", 25],
             ["Innodb_buffer_pool_read_requests", 100],
             ["com_select", 1],
@@ -37,13 +28,28 @@ class SqlData:
             ["com_delete", 1],
             ["com_replace", 1],
         ]
-        self.innodb_metrics = [["trx_rw_commits", 0]]
-        self.innodb_status = [["ndbcluster", "connection", "cluster_node_id=7"]]
-        self.latency_hist = [[2, 1, 5, 3, 1, 0.0588]]
-        self.master_status = [[1307, "test"]]
-        self.master_status_meta = [["Position"], ["Binlog_Do_DB"]]
-        self.replica_status = [["localhost", 60]]
-        self.replica_status_meta = [["Source_Host"], ["Connect_Retry"]]
+    )
+    innodb_metrics: List[List[Union[int, str]]] = field(
+        default_factory=lambda: [["trx_rw_commits", 0]]
+    )
+    innodb_status: List[List[str]] = field(
+        default_factory=lambda: [["ndbcluster", "connection", "cluster_node_id=7"]]
+    )
+    latency_hist: List[List[float]] = field(
+        default_factory=lambda: [[2, 1, 5, 3, 1, 0.0588]]
+    )
+    master_status: List[List[Union[int, str]]] = field(
+        default_factory=lambda: [[1307, "test"]]
+    )
+    master_status_meta: List[List[str]] = field(
+        default_factory=lambda: [["Position"], ["Binlog_Do_DB"]]
+    )
+    replica_status: List[List[Union[int, str]]] = field(
+        default_factory=lambda: [["localhost", 60]]
+    )
+    replica_status_meta: List[List[str]] = field(
+        default_factory=lambda: [["Source_Host"], ["Connect_Retry"]]
+    )
 
     def expected_default_result(self) -> Dict[str, Any]:
         """
@@ -57,43 +63,45 @@ class SqlData:
                 "innodb_metrics": {"trx_rw_commits": 0},
                 "engine": {
                     "innodb_status": "cluster_node_id=7",
-                    "master_status": json.dumps(
-                        {
-                            "Position": 1307,
-                            "Binlog_Do_DB": "test",
-                        }
-                    ),
-                    "replica_status": json.dumps(
-                        {"Source_Host": "localhost", "Connect_Retry": 60}
-                    ),
+                    "master_status": {
+                        "Position": 1307,
+                        "Binlog_Do_DB": "test",
+                    },
+                    "replica_status": {"Source_Host": "localhost", "Connect_Retry": 60},
                 },
                 "derived": {
                     "buffer_miss_ratio": 25.0,
                     "read_write_ratio": 0.25,
+                    "latency_p50_us": 0.0,
+                    "latency_p95_us": 0.0,
+                    "latency_p99_us": 0.0,
                 },
                 "performance_schema": {
-                    "events_statements_histogram_global": json.dumps(
-                        [
-                            {
-                                "bucket_number": 2,
-                                "bucket_timer_low": 1,
-                                "bucket_timer_high": 5,
-                                "count_bucket": 3,
-                                "count_bucket_and_lower": 1,
-                                "bucket_quantile": 0.0588,
-                            }
-                        ]
-                    )
+                    "events_statements_histogram_global": {
+                        "columns": [
+                            "bucket_number",
+                            "bucket_timer_low",
+                            "bucket_timer_high",
+                            "count_bucket",
+                            "count_bucket_and_lower",
+                            "bucket_quantile",
+                        ],
+                        "data": [[2, 1, 5, 3, 1, 0.0588]],
+                    }
                 },
             },
             "local": None,
         }
 
 
+@dataclass
 class Result:
-    def __init__(self) -> None:
-        self.value: Optional[List[Any]] = None
-        self.meta: List[List[str]] = []
+    """
+    Holds the rows and column meta data of the last query run against the mocks
+    """
+
+    value: Optional[List[Any]] = None
+    meta: List[List[str]] = field(default_factory=list)
 
 
 @pytest.fixture(name="mock_conn")
@@ -101,6 +109,15 @@ def _mock_conn() -> MagicMock:
     return MagicMock(spec=mysql.connector.connection.MySQLConnection)
 
 
+@pytest.fixture(name="mock_pool")
+def _mock_pool(mock_conn: MagicMock) -> MagicMock:
+    pool = MagicMock(spec=MySQLConnectionPool)
+    # a single worker keeps the queries sharing mock_conn in a deterministic order
+    pool.pool_size = 1
+    pool.get_connection.return_value = mock_conn
+    return pool
+
+
 def get_sql_api(data: SqlData, result: Result) -> Callable[[str], NoReturn]:
     """
     Used for providing a fake sql endpoint so we can return test data
@@ -125,10 +142,29 @@ def get_sql_api(data: SqlData, result: Result) -> Callable[[str], NoReturn]:
     return sql_fn
 
 
-def test_collect_knobs_success(mock_conn: MagicMock) -> NoReturn:
-    collector = MysqlCollector(mock_conn, "5.7.3")
+def mock_sql_api(conn: MagicMock, data: SqlData) -> MagicMock:
+    """
+    Make the cursors of the mock connection answer the queries from the test data
+    """
+    mock_cursor = conn.cursor.return_value
+    res = Result()
+    mock_cursor.execute.side_effect = get_sql_api(data, res)
+    mock_cursor.fetchall.side_effect = lambda: res.value
+    type(mock_cursor).description = PropertyMock(side_effect=lambda: res.meta)
+    return conn
+
+
+@pytest.fixture(name="sql_data")
+def _sql_data(mock_conn: MagicMock) -> SqlData:
+    data = SqlData()
+    mock_sql_api(mock_conn, data)
+    return data
+
+
+def test_collect_knobs_success(mock_conn: MagicMock, mock_pool: MagicMock) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "5.7.3")
     mock_cursor = mock_conn.cursor.return_value
-    expected = [["bulk_insert_buffer_size", 5000], ["tmpdir", "/tmp"]]
+    expected = [("bulk_insert_buffer_size", 5000), ("tmpdir", "/tmp")]
     mock_cursor.fetchall.return_value = expected
     result = collector.collect_knobs()
     assert result == {
@@ -137,88 +173,201 @@ def test_collect_knobs_success(mock_conn: MagicMock) -> NoReturn:
     }
 
 
-def test_get_version(mock_conn: MagicMock) -> NoReturn:
-    collector = MysqlCollector(mock_conn, "5.7.3")
+def test_get_version(mock_pool: MagicMock) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "5.7.3")
     version = collector.get_version()
     assert version == "5.7.3"
 
 
-def test_collect_knobs_sql_failure(mock_conn: MagicMock) -> NoReturn:
+# pyre-ignore[56]
+@pytest.mark.parametrize(
+    "version,replica_sql",
+    [
+        ("5.7.3", "SHOW SLAVE STATUS;"),
+        ("8.0.21", "SHOW SLAVE STATUS;"),
+        ("8.0.22", "SHOW REPLICA STATUS;"),
+        ("8.1", "SHOW REPLICA STATUS;"),
+        ("8.10.0", "SHOW REPLICA STATUS;"),
+    ],
+)
+def test_replica_sql_by_version(
+    mock_pool: MagicMock, version: str, replica_sql: str
+) -> NoReturn:
+    collector = MysqlCollector(mock_pool, version)
+    assert collector.ENGINE_REPLICA_SQL == replica_sql
+
+
+def test_collect_knobs_sql_failure(
+    mock_conn: MagicMock, mock_pool: MagicMock
+) -> NoReturn:
     mock_cursor = mock_conn.cursor.return_value
-    mock_cursor.fetchall.side_effect = mysql.connector.ProgrammingError("bad query")
-    collector = MysqlCollector(mock_conn, "5.7.3")
+    mock_cursor.execute.side_effect = mysql.connector.ProgrammingError("bad query")
+    collector = MysqlCollector(mock_pool, "5.7.3")
     with pytest.raises(MysqlCollectorException) as ex:
         collector.collect_knobs()
     assert "Failed to execute sql" in ex.value.message
 
 
-def test_collect_metrics_success_with_latency_hist(mock_conn: MagicMock) -> NoReturn:
-    mock_cursor = mock_conn.cursor.return_value
-    data = SqlData()
-    res = Result()
-    mock_cursor.execute.side_effect = get_sql_api(data, res)
-    mock_cursor.fetchall.side_effect = lambda: res.value
-    type(mock_cursor).description = PropertyMock(side_effect=lambda: res.meta)
-    collector = MysqlCollector(mock_conn, "8.0.0")
+def test_collect_metrics_success_with_latency_hist(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "8.0.0")
     metrics = collector.collect_metrics()
-    assert metrics == data.expected_default_result()
+    assert metrics == sql_data.expected_default_result()
 
 
-def test_collect_metrics_success_no_latency_hist(mock_conn: MagicMock) -> NoReturn:
-    mock_cursor = mock_conn.cursor.return_value
-    data = SqlData()
-    res = Result()
-    mock_cursor.execute.side_effect = get_sql_api(data, res)
-    mock_cursor.fetchall.side_effect = lambda: res.value
-    type(mock_cursor).description = PropertyMock(side_effect=lambda: res.meta)
-    collector = MysqlCollector(mock_conn, "7.9.9")
+def test_collect_metrics_success_no_latency_hist(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "7.9.9")
     metrics = collector.collect_metrics()
-    result = data.expected_default_result()
+    result = sql_data.expected_default_result()
     result["global"]["performance_schema"] = {}
+    result["global"]["derived"] = {"buffer_miss_ratio": 25.0, "read_write_ratio": 0.25}
     assert metrics == result
 
 
-def test_collect_metrics_success_no_master_status(mock_conn: MagicMock) -> NoReturn:
-    mock_cursor = mock_conn.cursor.return_value
-    data = SqlData()
-    data.master_status = []
-    res = Result()
-    mock_cursor.execute.side_effect = get_sql_api(data, res)
-    mock_cursor.fetchall.side_effect = lambda: res.value
-    type(mock_cursor).description = PropertyMock(side_effect=lambda: res.meta)
-    collector = MysqlCollector(mock_conn, "8.0.0")
+def test_collect_metrics_success_no_master_status(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    sql_data.master_status = []
+    collector = MysqlCollector(mock_pool, "8.0.0")
     metrics = collector.collect_metrics()
-    result = data.expected_default_result()
-    result["global"]["engine"]["master_status"] = ""
+    result = sql_data.expected_default_result()
+    result["global"]["engine"]["master_status"] = {}
     assert metrics == result
 
 
-def test_collect_metrics_success_no_replica_status(mock_conn: MagicMock) -> NoReturn:
-    mock_cursor = mock_conn.cursor.return_value
-    data = SqlData()
-    data.replica_status = []
-    res = Result()
-    mock_cursor.execute.side_effect = get_sql_api(data, res)
-    mock_cursor.fetchall.side_effect = lambda: res.value
-    type(mock_cursor).description = PropertyMock(side_effect=lambda: res.meta)
-    collector = MysqlCollector(mock_conn, "8.0.0")
+def test_collect_metrics_success_no_replica_status(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    sql_data.replica_status = []
+    collector = MysqlCollector(mock_pool, "8.0.0")
     metrics = collector.collect_metrics()
-    result = data.expected_default_result()
-    result["global"]["engine"]["replica_status"] = ""
+    result = sql_data.expected_default_result()
+    result["global"]["engine"]["replica_status"] = {}
     assert metrics == result
 
 
-def test_collect_metrics_sql_failure(mock_conn: MagicMock) -> NoReturn:
+@pytest.mark.usefixtures("sql_data")
+def test_connections_returned_to_pool(
+    mock_conn: MagicMock, mock_pool: MagicMock
+) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    collector.collect_metrics()
+    collector.check_permission()
+    assert mock_pool.get_connection.call_count == mock_conn.close.call_count
+
+
+def test_collect_metrics_derived_missing_status(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    sql_data.global_status = [
+        ["Innodb_buffer_pool_read_requests", 3],
+        ["com_select", 2],
+    ]
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    metrics = collector.collect_metrics()
+    assert metrics["global"]["derived"]["buffer_miss_ratio"] == 0.0
+    assert metrics["global"]["derived"]["read_write_ratio"] == 2.0
+
+
+def test_collect_metrics_latency_percentiles(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    sql_data.latency_hist = [
+        [0, 0, 10, 40, 40, 0.4],
+        [1, 10, 20, 55, 95, 0.95],
+        [2, 20, 40, 4, 99, 0.99],
+        [3, 40, 80, 1, 100, 1.0],
+    ]
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    derived = collector.collect_metrics()["global"]["derived"]
+    assert derived["latency_p50_us"] == 20
+    assert derived["latency_p95_us"] == 20
+    assert derived["latency_p99_us"] == 40
+
+
+def test_collect_metrics_master_status_column_mismatch(
+    mock_pool: MagicMock, sql_data: SqlData
+) -> NoReturn:
+    sql_data.master_status_meta = [["Position"]]
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    with pytest.raises(MysqlCollectorException) as ex:
+        collector.collect_metrics()
+    assert "2 values for 1 columns" in ex.value.message
+
+
+def test_collect_metrics_sql_failure(
+    mock_conn: MagicMock, mock_pool: MagicMock
+) -> NoReturn:
     mock_cursor = mock_conn.cursor.return_value
     mock_cursor.fetchall.side_effect = mysql.connector.ProgrammingError("bad query")
-    collector = MysqlCollector(mock_conn, "5.7.3")
+    collector = MysqlCollector(mock_pool, "5.7.3")
     with pytest.raises(MysqlCollectorException) as ex:
         collector.collect_metrics()
     assert "Failed to execute sql" in ex.value.message
 
 
-def test_check_permissions_success(mock_conn: MagicMock) -> NoReturn:
-    collector = MysqlCollector(mock_conn, "8.0.0")
+def test_collect_metrics_concurrent(mock_pool: MagicMock) -> NoReturn:
+    data = SqlData()
+    mock_pool.pool_size = 6
+    mock_pool.get_connection.side_effect = lambda: mock_sql_api(
+        MagicMock(spec=mysql.connector.connection.MySQLConnection), data
+    )
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    metrics = collector.collect_metrics()
+    assert metrics == data.expected_default_result()
+    assert mock_pool.get_connection.call_count == 6
+
+
+def test_collect_metrics_concurrent_sql_failure(
+    mock_conn: MagicMock, mock_pool: MagicMock
+) -> NoReturn:
+    mock_pool.pool_size = 6
+    mock_conn.cursor.return_value.fetchall.side_effect = (
+        mysql.connector.ProgrammingError("bad query")
+    )
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    with pytest.raises(MysqlCollectorException) as ex:
+        collector.collect_metrics()
+    assert "Failed to execute sql" in ex.value.message
+    assert mock_conn.close.call_count == mock_pool.get_connection.call_count
+
+
+def test_check_permissions_success(mock_pool: MagicMock) -> NoReturn:
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    assert collector.check_permission() == (True, [], "")
+
+
+def test_check_permissions_cached(
+    mock_conn: MagicMock, mock_pool: MagicMock, monkeypatch: pytest.MonkeyPatch
+) -> NoReturn:
+    mock_cursor = mock_conn.cursor.return_value
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    monkeypatch.setattr("driver.collector.mysql_collector._PERMISSION_OK_TS", {})
+    first = MysqlCollector(mock_pool, "8.0.0").check_permission()
+    num_queries = mock_cursor.execute.call_count
+    # a collector is created for every collection, the check is cached for the pool
+    assert MysqlCollector(mock_pool, "8.0.0").check_permission() == first
+    assert mock_cursor.execute.call_count == num_queries
+    now[0] += MysqlCollector.PERMISSION_CACHE_TTL_S
+    assert MysqlCollector(mock_pool, "8.0.0").check_permission() == first
+    assert mock_cursor.execute.call_count == 2 * num_queries
+
+
+def test_check_permissions_failure_not_cached(
+    mock_conn: MagicMock, mock_pool: MagicMock
+) -> NoReturn:
+    mock_cursor = mock_conn.cursor.return_value
+    mock_cursor.fetchall.side_effect = mysql.connector.Error(
+        errno=errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR
+    )
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    assert not collector.check_permission()[0]
+    # the privilege is granted before the next check
+    mock_cursor.fetchall.side_effect = None
     assert collector.check_permission() == (True, [], "")
 
 
@@ -233,20 +382,21 @@ def test_check_permissions_success(mock_conn: MagicMock) -> NoReturn:
     ],
 )
 def test_check_permissions_specific_access_denied(
-    mock_conn: MagicMock, code: int
+    mock_conn: MagicMock, mock_pool: MagicMock, code: int
 ) -> NoReturn:
     mock_cursor = mock_conn.cursor.return_value
     mock_cursor.fetchall.side_effect = mysql.connector.Error(errno=code)
-    collector = MysqlCollector(mock_conn, "8.0.0")
-    success, results, _ = collector.check_permission()
+    collector = MysqlCollector(mock_pool, "8.0.0")
+    success, results, text = collector.check_permission()
     assert not success
+    assert text.count("Permissions check failed for SQL") == len(results)
     for info in results:
-        assert not info["success"]
+        assert not info.success
         if code in [
             errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR,
             errorcode.ER_ACCESS_DENIED_ERROR,
             errorcode.ER_TABLEACCESS_DENIED_ERROR,
         ]:
-            assert "GRANT" in info["example"]
+            assert "GRANT" in info.example
         else:
-            assert "unknown" in info["example"]
+            assert "unknown" in info.example